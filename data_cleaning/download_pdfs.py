@@ -2,9 +2,16 @@
 download_pdfs.py - Download PDFs for papers in the database
 """
 
+import os
 import requests
+import shutil
 import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from pathlib import Path
+from urllib.parse import urlparse
+from pymongo import UpdateOne
+from requests.adapters import HTTPAdapter
 from tqdm import tqdm
 import time
 
@@ -16,58 +23,110 @@ from Database.db import get_db
 
 PDF_DIR = Path(__file__).parent.parent / "data" / "pdfs"
 TIMEOUT = 30
+# only the fields the download loop reads
+DOWNLOAD_PROJECTION = {"_id": 1, "open_access.pdf_url": 1, "title": 1, "year": 1}
 DELAY = 1
+BATCH_SIZE = 50  # status updates per bulk_write
+MAX_WORKERS = 16
+PER_HOST = 2  # concurrent downloads allowed per publisher host
+CHUNK_SIZE = 64 * 1024
+CURSOR_BATCH = 200
+_SAFE_ID = str.maketrans({'/': '_', ':': '_'})
+
+# one pooled session so repeat hosts reuse their keep-alive connections
+SESSION = requests.Session()
+_adapter = HTTPAdapter(pool_connections=32, pool_maxsize=32)
+SESSION.mount("http://", _adapter)
+SESSION.mount("https://", _adapter)
+SESSION.headers.update({'User-Agent': 'AcademicLanguageAnalysis/1.0 (research project)'})
 
 
 # --- Functions ---
 
 def get_papers_to_download(db, limit=None):
-    """Get papers with PDF URLs that haven't been downloaded."""
+    """
+    Get papers with PDF URLs that haven't been downloaded.
+    Returns (cursor, total) - the cursor streams in batches.
+    """
     coll = db['papers']
     query = {
-        "open_access.pdf_url": {"$ne": "", "$ne": None},
+        "open_access.pdf_url": {"$nin": ["", None]},
         "processing_status": "pending_download"
     }
-    cursor = coll.find(query)
+    total = coll.count_documents(query, limit=limit) if limit else coll.count_documents(query)
+    cursor = coll.find(query, DOWNLOAD_PROJECTION)
     if limit:
         cursor = cursor.limit(limit)
-    return list(cursor)
+    return cursor.batch_size(CURSOR_BATCH), total
 
 
 def download_pdf(url, save_path):
-    """Download PDF from URL."""
+    """Download PDF from URL, streaming it to disk."""
+    tmp_path = save_path.with_suffix('.tmp')
     try:
-        headers = {'User-Agent': 'AcademicLanguageAnalysis/1.0 (research project)'}
-        r = requests.get(url, timeout=TIMEOUT, headers=headers, allow_redirects=True)
-        r.raise_for_status()
-        
-        content_type = r.headers.get('content-type', '')
-        if 'pdf' not in content_type.lower() and not r.content[:4] == b'%PDF':
-            return False, "Not a PDF"
-        
-        save_path.parent.mkdir(parents=True, exist_ok=True)
-        save_path.write_bytes(r.content)
+        with SESSION.get(url, timeout=TIMEOUT, allow_redirects=True, stream=True) as r:
+            r.raise_for_status()
+            r.raw.decode_content = True  # undo gzip/deflate transfer encoding
+            
+            magic = r.raw.read(4)
+            content_type = r.headers.get('content-type', '')
+            if 'pdf' not in content_type.lower() and not magic == b'%PDF':
+                return False, "Not a PDF"
+            
+            with tmp_path.open('wb') as fh:
+                fh.write(magic)
+                shutil.copyfileobj(r.raw, fh, length=CHUNK_SIZE)
+        # only a complete file ever shows up under the real name
+        os.replace(tmp_path, save_path)
         return True, None
     except Exception as e:
+        tmp_path.unlink(missing_ok=True)
         return False, str(e)
 
 
-def update_paper_status(db, paper_id, status, local_path=None):
-    """Update paper processing status."""
+def pdf_path(paper):
+    """Where a paper's PDF goes on disk (the year dir is created in main)."""
+    year = paper.get('year') or 'unknown'
+    safe_id = paper['_id'].translate(_SAFE_ID)[-50:]
+    return PDF_DIR / str(year) / f"{safe_id}.pdf"
+
+
+def _download_one(paper, host_limits):
+    """Worker: download one paper's PDF, holding its host's slot."""
+    url = paper['open_access']['pdf_url']
+    save_path = pdf_path(paper)
+    with host_limits[urlparse(url).netloc]:
+        ok, err = download_pdf(url, save_path)
+        time.sleep(DELAY)  # politeness delay is per host now, not global
+    return paper, save_path, ok, err
+
+
+def status_update(paper_id, status, local_path=None):
+    """Build the UpdateOne op for a paper's processing status."""
     update = {"$set": {"processing_status": status}}
     if local_path:
         update["$set"]["content.local_path"] = str(local_path)
-    db['papers'].update_one({"_id": paper_id}, update)
+    return UpdateOne({"_id": paper_id}, update)
+
+
+def flush_status_updates(db, ops):
+    """Write queued status updates in one round-trip."""
+    if ops:
+        db['papers'].bulk_write(ops, ordered=False)
 
 
 def show_status(db):
     """Show download status."""
-    coll = db['papers']
-    total = coll.count_documents({})
-    pending = coll.count_documents({"processing_status": "pending_download"})
-    downloaded = coll.count_documents({"processing_status": "downloaded"})
-    failed = coll.count_documents({"processing_status": "failed"})
-    no_pdf = coll.count_documents({"processing_status": "no_pdf_available"})
+    # one grouped pass instead of a count_documents per status
+    counts = {
+        doc['_id']: doc['n']
+        for doc in db['papers'].aggregate([{"$group": {"_id": "$processing_status", "n": {"$sum": 1}}}])
+    }
+    total = sum(counts.values())
+    pending = counts.get("pending_download", 0)
+    downloaded = counts.get("downloaded", 0)
+    failed = counts.get("failed", 0)
+    no_pdf = counts.get("no_pdf_available", 0)
     
     print(f"\nDownload status:")
     print(f"Total papers: {total}")
@@ -91,39 +150,53 @@ def main():
         show_status(db)
         return
     
-    papers = get_papers_to_download(db, limit=args.limit)
+    papers, total = get_papers_to_download(db, limit=args.limit)
     
-    if not papers:
+    if not total:
         print("No papers to download.")
         show_status(db)
         return
     
-    print(f"Downloading {len(papers)} PDFs...")
+    print(f"Downloading {total} PDFs...")
     
     success = 0
     failed = 0
+    pending_ops = []
     
-    with tqdm(papers, desc="Downloading", unit="pdf") as pbar:
-        for paper in pbar:
-            paper_id = paper['_id']
-            url = paper['open_access']['pdf_url']
-            year = paper.get('year') or 'unknown'
-            
-            safe_id = paper_id.replace('/', '_').replace(':', '_')[-50:]
-            save_path = PDF_DIR / str(year) / f"{safe_id}.pdf"
-            
-            pbar.set_postfix_str(paper['title'][:30] + "...")
-            
-            ok, err = download_pdf(url, save_path)
-            
-            if ok:
-                update_paper_status(db, paper_id, "downloaded", save_path)
-                success += 1
-            else:
-                update_paper_status(db, paper_id, "failed")
-                failed += 1
-            
-            time.sleep(DELAY)
+    host_limits = {}
+    year_dirs = set()
+    
+    # flush in finally so PDFs already on disk never stay pending_download after an interrupt
+    try:
+        with ThreadPoolExecutor(max_workers=MAX_WORKERS) as ex:
+            futures = []
+            for p in papers:
+                # semaphores are only created here on the main thread, so workers never race on them
+                host = urlparse(p['open_access']['pdf_url']).netloc
+                host_limits.setdefault(host, threading.Semaphore(PER_HOST))
+                # only a handful of year dirs exist, mkdir each once instead of per PDF
+                year_dir = pdf_path(p).parent
+                if year_dir not in year_dirs:
+                    year_dir.mkdir(parents=True, exist_ok=True)
+                    year_dirs.add(year_dir)
+                futures.append(ex.submit(_download_one, p, host_limits))
+            with tqdm(as_completed(futures), total=len(futures), desc="Downloading", unit="pdf") as pbar:
+                for fut in pbar:
+                    paper, save_path, ok, err = fut.result()
+                    pbar.set_postfix_str(paper['title'][:30] + "...")
+                
+                    if ok:
+                        pending_ops.append(status_update(paper['_id'], "downloaded", save_path))
+                        success += 1
+                    else:
+                        pending_ops.append(status_update(paper['_id'], "failed"))
+                        failed += 1
+                
+                    if len(pending_ops) >= BATCH_SIZE:
+                        flush_status_updates(db, pending_ops)
+                        pending_ops = []
+    finally:
+        flush_status_updates(db, pending_ops)
     
     print(f"\nSuccess: {success}, Failed: {failed}")
     show_status(db)
@@ -9,7 +9,9 @@ import langextract as lx
 import textwrap
 import argparse
 import sys
+from itertools import chain
 from pathlib import Path
+from pymongo import ReplaceOne
 from tqdm import tqdm
 
 sys.path.insert(0, str(Path(__file__).parent.parent))
@@ -21,6 +23,11 @@ from Database.db import get_db
 MODEL_ID = "gemini-2.5-flash"
 OUTPUT_DIR = Path(__file__).parent / "output"
 SCRIPT_VERSION = "v1.0"
+BATCH_SIZE = 10  # kept small so a crash doesn't lose many LLM results
+# only the fields the extraction loop reads
+PAPER_PROJECTION = {"_id": 1, "content.abstract": 1, "title": 1}
+CURSOR_BATCH = 20  # small - each doc is an LLM call, keep getMores inside the idle cursor timeout
+LOOKUP_THRESHOLD = 50_000  # past this many extractions, anti-join with $lookup instead of $nin
 
 
 # --- Prompts & Examples ---
@@ -68,14 +75,14 @@ def get_extraction_examples():
     ]
 
 
+# built once - the exemplars never change between papers
+_EXAMPLES = get_extraction_examples()
+
+
 # --- Core functions ---
 
-def extract_from_text(text, prompt=None, examples=None, model_id=None):
+def extract_from_text(text, prompt=EXTRACTION_PROMPT, examples=_EXAMPLES, model_id=MODEL_ID):
     """Run extraction on text."""
-    prompt = prompt or EXTRACTION_PROMPT
-    examples = examples or get_extraction_examples()
-    model_id = model_id or MODEL_ID
-
     return lx.extract(
         text_or_documents=text,
         prompt_description=prompt,
@@ -85,32 +92,44 @@ def extract_from_text(text, prompt=None, examples=None, model_id=None):
 
 
 def get_papers_to_process(db, limit=None, only_unprocessed=True):
-    """Get papers with abstracts, optionally skip already processed."""
+    """
+    Get papers with abstracts, optionally skip already processed.
+    Returns (cursor, total) - the cursor streams in batches. total is None on
+    the $lookup path, counting there would mean running the anti-join twice.
+    """
     coll = db['papers']
-    query = {"content.abstract": {"$ne": "", "$ne": None}}
+    query = {"content.abstract": {"$nin": ["", None]}}
     
     if only_unprocessed:
-        processed_ids = set(
-            doc['paper_id'] for doc in db['extracted_features'].find({}, {"paper_id": 1})
-        )
-        papers = []
-        for p in coll.find(query):
-            if p['_id'] not in processed_ids:
-                papers.append(p)
-                if limit and len(papers) >= limit:
-                    break
-        return papers
-    else:
-        cursor = coll.find(query)
-        if limit:
-            cursor = cursor.limit(limit)
-        return list(cursor)
-
-
-def save_extraction_to_db(db, paper_id, extraction_result):
-    """Save extraction results to extracted_features collection."""
-    coll = db['extracted_features']
-    
+        # let Mongo do the anti-join so we only pull `limit` papers over the wire
+        if db['extracted_features'].estimated_document_count() > LOOKUP_THRESHOLD:
+            pipeline = [
+                {"$match": query},
+                {"$lookup": {
+                    "from": "extracted_features",
+                    "localField": "_id",
+                    "foreignField": "paper_id",
+                    "as": "ef"
+                }},
+                {"$match": {"ef": {"$size": 0}}},
+                {"$project": PAPER_PROJECTION},
+            ]
+            if limit:
+                pipeline.append({"$limit": limit})
+            return coll.aggregate(pipeline, batchSize=CURSOR_BATCH), None
+
+        processed_ids = db['extracted_features'].distinct("paper_id")
+        query = {**query, "_id": {"$nin": processed_ids}}
+
+    total = coll.count_documents(query, limit=limit) if limit else coll.count_documents(query)
+    cursor = coll.find(query, PAPER_PROJECTION)
+    if limit:
+        cursor = cursor.limit(limit)
+    return cursor.batch_size(CURSOR_BATCH), total
+
+
+def build_extraction_doc(paper_id, extraction_result):
+    """Turn a LangExtract result into an extracted_features doc."""
     extractions = []
     if hasattr(extraction_result, 'extractions'):
         for ext in extraction_result.extractions:
@@ -128,11 +147,16 @@ def save_extraction_to_db(db, paper_id, extraction_result):
             "extraction_count": len(extractions)
         }
     }
-    
-    coll.replace_one({"paper_id": paper_id}, doc, upsert=True)
     return doc
 
 
+def save_extractions_to_db(db, docs):
+    """Upsert a batch of extraction docs in one round-trip."""
+    if docs:
+        ops = [ReplaceOne({"paper_id": d['paper_id']}, d, upsert=True) for d in docs]
+        db['extracted_features'].bulk_write(ops, ordered=False)
+
+
 def save_results_to_file(results, output_dir=None):
     """Save results to JSONL for visualization."""
     output_dir = Path(output_dir or OUTPUT_DIR)
@@ -158,7 +182,7 @@ def generate_visualization(input_file, output_dir=None):
 def show_db_status(db):
     """Print database status"""
     papers_count = db['papers'].count_documents({})
-    with_abstract = db['papers'].count_documents({"content.abstract": {"$ne": "", "$ne": None}})
+    with_abstract = db['papers'].count_documents({"content.abstract": {"$nin": ["", None]}})
     extracted = db['extracted_features'].count_documents({})
     
     print(f"\nDatabase status:")
@@ -190,9 +214,11 @@ def process_papers(limit=5, save_viz=True, reprocess=False):
         return
     
     print("\nFetching papers...")
-    papers = get_papers_to_process(db, limit=limit, only_unprocessed=not reprocess)
+    papers, total = get_papers_to_process(db, limit=limit, only_unprocessed=not reprocess)
     
-    if not papers:
+    # peek instead of trusting total, which may be None
+    first = next(papers, None)
+    if first is None:
         if with_abstract == 0:
             print("No papers have abstracts.")
         else:
@@ -201,21 +227,30 @@ def process_papers(limit=5, save_viz=True, reprocess=False):
     
     results = []
     errors = []
+    pending_docs = []
     
-    with tqdm(papers, desc="Extracting", unit="paper") as pbar:
-        for paper in pbar:
-            paper_id = paper['_id']
-            abstract = paper['content']['abstract']
-            title = paper['title'][:40] + "..." if len(paper['title']) > 40 else paper['title']
+    # flush in finally so an interrupt or db error never loses extractions already paid for
+    try:
+        with tqdm(chain([first], papers), total=total, desc="Extracting", unit="paper") as pbar:
+            for paper in pbar:
+                paper_id = paper['_id']
+                abstract = paper['content']['abstract']
+                title = paper['title'][:40] + "..." if len(paper['title']) > 40 else paper['title']
+            
+                pbar.set_postfix_str(title)
             
-            pbar.set_postfix_str(title)
+                try:
+                    result = extract_from_text(abstract)
+                    pending_docs.append(build_extraction_doc(paper_id, result))
+                    results.append(result)
+                except Exception as e:
+                    errors.append((paper_id, str(e)))
             
-            try:
-                result = extract_from_text(abstract)
-                save_extraction_to_db(db, paper_id, result)
-                results.append(result)
-            except Exception as e:
-                errors.append((paper_id, str(e)))
+                if len(pending_docs) >= BATCH_SIZE:
+                    save_extractions_to_db(db, pending_docs)
+                    pending_docs = []
+    finally:
+        save_extractions_to_db(db, pending_docs)
     
     print(f"\nProcessed {len(results)} papers")
     if errors:
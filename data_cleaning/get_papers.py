@@ -4,12 +4,16 @@ get_papers.py - Fetch ecology papers from OpenAlex + enrich with Crossref/Unpayw
 Pulls metadata, calculates impact scores, and upserts to MongoDB.
 """
 
+import argparse
 import json
 import requests
 import os
 import sys
 from pathlib import Path
 from dotenv import load_dotenv
+from pymongo import ReplaceOne
+from pymongo.write_concern import WriteConcern
+from pymongo.errors import BulkWriteError
 from requests.exceptions import RequestException
 from tqdm import tqdm
 
@@ -17,8 +21,9 @@ sys.path.insert(0, str(Path(__file__).parent.parent))
 sys.path.insert(0, str(Path(__file__).parent))
 
 from lib.util import (
-    fetch_crossref,
-    fetch_unpaywall,
+    fetch_crossref_bulk,
+    gather_metadata,
+    invalidate,
     normalize_doi,
     build_paper_document
 )
@@ -39,13 +44,18 @@ if not TOPIC_ID:
 if not BASE_URL:
     BASE_URL = "https://api.openalex.org/works"
 
+CONCURRENCY = 10  # Unpaywall requests in flight at once
+# primary ack only, no journal wait - every doc can be refetched if a write is lost
+INGEST_WRITE_CONCERN = WriteConcern(w=1, j=False)
+DEFAULT_LIMIT = 200
+
 
 # --- API params ---
 
 params = {
     'filter': f'concepts.id:{TOPIC_ID},publication_year:2020-2025,is_oa:true,has_abstract:true',
     'sort': 'cited_by_count:desc',
-    'per-page': 50,
+    'per-page': 200,  # OpenAlex max
 }
 if EMAIL:
     params['mailto'] = EMAIL
@@ -53,60 +63,106 @@ if EMAIL:
 
 # --- Functions ---
 
-def fetch_papers():
-    """Query OpenAlex API."""
+def fetch_papers(limit=DEFAULT_LIMIT):
+    """Query OpenAlex API, yielding one page of results at a time (cursor pagination)."""
     print("Searching for ecology papers with abstracts...")
     print(f"Query: {params['filter']}")
-    try:
-        response = requests.get(BASE_URL, params=params, timeout=15)
-        response.raise_for_status()
-        data = response.json()
-        print(f"Found {data.get('meta', {}).get('count', 0)} total matches")
-        return data
-    except RequestException as e:
-        print(f"API request failed: {e}")
-        sys.exit(1)
-    except json.JSONDecodeError:
-        print("Couldn't parse API response")
-        sys.exit(1)
-
-
-def process_and_enrich(data):
-    """Process results and enrich with additional APIs."""
-    papers = []
-    results = data.get('results', [])
-    
+    page_params = dict(params, cursor="*")
+    fetched = 0
+
+    while page_params['cursor'] and fetched < limit:
+        try:
+            response = requests.get(BASE_URL, params=page_params, timeout=15)
+            response.raise_for_status()
+            data = response.json()
+        except (RequestException, json.JSONDecodeError) as e:
+            print(f"API request failed: {e}")
+            if not fetched:
+                sys.exit(1)
+            return  # keep what we already got
+
+        if not fetched:
+            print(f"Found {data.get('meta', {}).get('count', 0)} total matches")
+
+        results = (data.get('results') or [])[:limit - fetched]
+        if not results:
+            return
+        fetched += len(results)
+        yield results
+
+        page_params['cursor'] = data.get('meta', {}).get('next_cursor')
+
+
+def process_and_enrich(results, refresh=False):
+    """Process a page of results and enrich with additional APIs."""
     print(f"Processing {len(results)} papers...")
     
-    for work in tqdm(results, desc="Enriching", unit="paper"):
-        doi = normalize_doi(work.get('doi'))
-        crossref = fetch_crossref(doi) if doi else {}
-        unpaywall = fetch_unpaywall(doi, EMAIL) if doi else {}
-        doc = build_paper_document(work, crossref, unpaywall)
-        papers.append(doc)
+    dois = [normalize_doi(w.get('doi')) for w in results]
+    if refresh:
+        # drop cached Crossref/Unpaywall responses so these get refetched
+        for doi in dois:
+            if doi:
+                invalidate(doi)
+    
+    # Crossref takes DOIs in bulk, so grab the whole page's worth up front
+    crossref_by_doi = fetch_crossref_bulk(dois)
+    
+    # Unpaywall is still per DOI - run those concurrently on one event loop
+    unpaywall_by_doi = {
+        doi: unpaywall
+        for doi, (_, unpaywall) in gather_metadata(dois, EMAIL, CONCURRENCY, crossref=False).items()
+    }
+    
+    # building docs stays in-process: ~50us each, about what pickling the
+    # inputs to a ProcessPoolExecutor worker would cost, so a pool only adds overhead
+    papers = []
+    for work, doi in tqdm(zip(results, dois), total=len(results), desc="Enriching", unit="paper"):
+        crossref = crossref_by_doi.get(doi, {}) if doi else {}
+        unpaywall = unpaywall_by_doi.get(doi, {}) if doi else {}
+        papers.append(build_paper_document(work, crossref, unpaywall))
     
     return papers
 
 
+def _print_write_errors(e):
+    """Show the first few failures from an unordered bulk op."""
+    for err in e.details.get('writeErrors', [])[:5]:
+        op = err.get('op', {})
+        _id = op.get('_id') or op.get('q', {}).get('_id')
+        print(f"DB error for {_id}: {err.get('errmsg')}")
+
+
 def upsert_to_db(papers):
-    """Insert or update papers in MongoDB."""
+    """Insert or update papers in MongoDB (3 round-trips regardless of count)."""
     db = get_db()
-    coll = db['papers']
+    coll = db['papers'].with_options(write_concern=INGEST_WRITE_CONCERN)
+
+    papers = [d for d in papers if d.get('_id')]
+    if not papers:
+        return 0, 0
+
+    # split into brand-new vs already-stored so new ones can go through insert_many
+    ids = [d['_id'] for d in papers]
+    existing = set(coll.distinct("_id", {"_id": {"$in": ids}}))
+    new = [d for d in papers if d['_id'] not in existing]
+    upd = [d for d in papers if d['_id'] in existing]
     inserted = 0
     updated = 0
 
-    for doc in papers:
-        _id = doc.get('_id')
-        if not _id:
-            continue
+    # unordered, so one bad doc doesn't stop the rest
+    if new:
+        try:
+            inserted = len(coll.insert_many(new, ordered=False).inserted_ids)
+        except BulkWriteError as e:
+            _print_write_errors(e)
+            inserted = e.details.get('nInserted', 0)
+    if upd:
         try:
-            result = coll.replace_one({"_id": _id}, doc, upsert=True)
-            if result.upserted_id:
-                inserted += 1
-            elif result.modified_count:
-                updated += 1
-        except Exception as e:
-            print(f"DB error for {_id}: {e}")
+            result = coll.bulk_write([ReplaceOne({"_id": d['_id']}, d) for d in upd], ordered=False)
+            updated = result.modified_count
+        except BulkWriteError as e:
+            _print_write_errors(e)
+            updated = e.details.get('nModified', 0)
 
     return inserted, updated
 
@@ -132,9 +188,21 @@ def print_summary(papers, inserted, updated):
 
 
 def main():
-    data = fetch_papers()
-    papers = process_and_enrich(data)
-    inserted, updated = upsert_to_db(papers)
+    parser = argparse.ArgumentParser(description="Fetch papers from OpenAlex into MongoDB")
+    parser.add_argument("-n", "--limit", type=int, default=DEFAULT_LIMIT, help="Max papers to fetch")
+    parser.add_argument("--refresh", action="store_true", help="Ignore cached Crossref/Unpaywall responses")
+    args = parser.parse_args()
+
+    # enrich + upsert each page as it arrives rather than holding everything first
+    papers = []
+    inserted = updated = 0
+    for page in fetch_papers(args.limit):
+        docs = process_and_enrich(page, refresh=args.refresh)
+        page_inserted, page_updated = upsert_to_db(docs)
+        inserted += page_inserted
+        updated += page_updated
+        papers.extend(docs)
+
     print_summary(papers, inserted, updated)
     print("\nNext: python data_cleaning/extract.py -n 5")
 
@@ -0,0 +1,19 @@
+"""
+text.py - Tokenizer shared by the jargon scripts
+
+analyze_jargon and pilot_script compute the same metric, so they split
+text the same way.
+"""
+
+import re
+
+# matches either case so we lowercase ~10-char tokens, not a copy of the whole text.
+# same words as \b[a-z]{3,}\b on text.lower(), except the Kelvin sign and dotted
+# capital I, which lower() turns into ASCII but this doesn't match
+WORD_RE = re.compile(r'\b[A-Za-z]{3,}\b')
+
+
+def iter_words(text):
+    """Yield lowercase ASCII words of 3+ letters."""
+    for m in WORD_RE.finditer(text):
+        yield m.group(0).lower()
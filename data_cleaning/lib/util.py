@@ -4,24 +4,147 @@ util.py - Helper functions for the data pipeline
 API calls, author extraction, impact scoring, doc building.
 """
 
+import asyncio
+import atexit
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
 from datetime import datetime
+from functools import lru_cache
+from pathlib import Path
+import aiohttp
 import requests
+from dotenv import load_dotenv
+from requests.adapters import HTTPAdapter
 from urllib.parse import quote
+from urllib3.util.retry import Retry
+
+try:
+    import orjson
+    _loads = orjson.loads
+except ImportError:
+    # optional - several times faster on big Crossref payloads, stdlib works too
+    _loads = json.loads
+
+load_dotenv()
+
+
+# --- HTTP session ---
+
+_EMAIL = os.getenv("EMAIL")
+
+# a mailto in the User-Agent gets us into Crossref's "polite pool"
+_HEADERS = {
+    "User-Agent": f"academic-language-analysis/1.0 (mailto:{_EMAIL})" if _EMAIL else "academic-language-analysis/1.0",
+    "Accept": "application/json",
+}
+
+# transient statuses worth retrying, shared by the sync session and the async fetches
+_RETRY_STATUSES = (429, 500, 502, 503, 504)
+_RETRY_TOTAL = 3
+_RETRY_BACKOFF = 0.3
+
+# shared keep-alive session so repeat calls skip the TCP/TLS handshake
+_SESSION = requests.Session()
+_SESSION.mount("https://", HTTPAdapter(
+    pool_connections=10,
+    pool_maxsize=20,
+    max_retries=Retry(total=_RETRY_TOTAL, backoff_factor=_RETRY_BACKOFF, status_forcelist=_RETRY_STATUSES),
+))
+_SESSION.headers.update(_HEADERS)
+atexit.register(_SESSION.close)
+
+
+# --- DOI metadata cache ---
+
+CACHE_PATH = Path.home() / ".cache" / "ala" / "doi_cache.sqlite3"
+CACHE_TTL = 30 * 86400  # seconds before a cached response is refetched
+
+_cache_conn = None
+_cache_lock = threading.Lock()
+
+
+def _cache():
+    """Open (and create if needed) the sqlite cache on first use"""
+    global _cache_conn
+    if _cache_conn is None:
+        CACHE_PATH.parent.mkdir(parents=True, exist_ok=True)
+        _cache_conn = sqlite3.connect(CACHE_PATH, check_same_thread=False)
+        _cache_conn.execute("PRAGMA journal_mode=WAL")
+        _cache_conn.execute(
+            "CREATE TABLE IF NOT EXISTS doi_cache ("
+            "endpoint TEXT, doi TEXT, fetched_at INTEGER, payload BLOB, "
+            "PRIMARY KEY (endpoint, doi))"
+        )
+        atexit.register(_cache_conn.close)
+    return _cache_conn
+
+
+def _cache_get(endpoint, doi):
+    """Cached payload for (endpoint, doi), or None if missing/expired"""
+    try:
+        with _cache_lock:
+            row = _cache().execute(
+                "SELECT fetched_at, payload FROM doi_cache WHERE endpoint = ? AND doi = ?",
+                (endpoint, normalize_doi(doi))
+            ).fetchone()
+    except (sqlite3.Error, OSError):
+        return None  # cache is best-effort, never break a fetch over it
+    if row and time.time() - row[0] < CACHE_TTL:
+        return _loads(row[1])
+    return None
+
+
+def _cache_put(endpoint, doi, payload):
+    """Store a payload; empty results (failed fetches) aren't cached"""
+    if not payload:
+        return
+    try:
+        with _cache_lock:
+            conn = _cache()
+            conn.execute(
+                "INSERT OR REPLACE INTO doi_cache VALUES (?, ?, ?, ?)",
+                (endpoint, normalize_doi(doi), int(time.time()), json.dumps(payload).encode())
+            )
+            conn.commit()
+    except (sqlite3.Error, OSError):
+        pass
+
+
+def invalidate(doi):
+    """Drop every cached response for a DOI so the next fetch hits the API"""
+    try:
+        with _cache_lock:
+            conn = _cache()
+            conn.execute("DELETE FROM doi_cache WHERE doi = ?", (normalize_doi(doi),))
+            conn.commit()
+    except (sqlite3.Error, OSError):
+        pass
 
 
 # --- Impact scoring ---
 
+# read once - a pipeline run won't span a new year in any way that matters
+_CURRENT_YEAR = datetime.now().year
+
+
 def impact_score(citations, publication_year):
     """
     Citations per year since publication
     Minimum age of 1 year to avoid divide-by-zero
     """
-    try:
-        year = int(publication_year)
-    except Exception:
-        year = None
+    if isinstance(publication_year, int):
+        year = publication_year  # OpenAlex already gives ints
+    else:
+        try:
+            year = int(publication_year)
+        except Exception:
+            year = None
 
-    current_year = datetime.now().year
+    current_year = _CURRENT_YEAR
     if year and year <= current_year:
         age = max(1, current_year - year + 1)
     else:
@@ -51,6 +174,19 @@ def determine_processing_status(pdf_url):
 
 # --- External API calls ---
 
+# the usual DOI alphabet - all legal as-is in a URL path, and both APIs
+# document raw DOIs (slash included) in their /works/{doi} and /v2/{doi} paths
+_SAFE_DOI = re.compile(r'[A-Za-z0-9./_\-:]+')
+
+
+def _quoted_doi(doi):
+    """DOI with any URL prefix stripped, escaped for use in a URL path"""
+    doi_clean = doi.removeprefix("https://doi.org/").removeprefix("http://doi.org/")
+    if _SAFE_DOI.fullmatch(doi_clean):
+        return doi_clean  # common case, skip quote()'s per-char loop
+    return quote(doi_clean, safe='')
+
+
 def fetch_crossref(doi, timeout=10):
     """
     Get metadata from Crossref for a DOI
@@ -58,16 +194,60 @@ def fetch_crossref(doi, timeout=10):
     """
     if not doi:
         return {}
+    cached = _cache_get('crossref', doi)
+    if cached is not None:
+        return cached
     
-    doi_clean = doi.replace("https://doi.org/", "").replace("http://doi.org/", "")
-    url = f"https://api.crossref.org/works/{quote(doi_clean, safe='')}"
+    url = f"https://api.crossref.org/works/{_quoted_doi(doi)}"
     
     try:
-        r = requests.get(url, timeout=timeout)
+        r = _SESSION.get(url, timeout=timeout)
         r.raise_for_status()
-        return r.json().get('message', {})
+        message = _loads(r.content).get('message', {})
     except Exception:
         return {}
+    _cache_put('crossref', doi, message)
+    return message
+
+
+def fetch_crossref_bulk(dois, batch_size=50, timeout=20):
+    """
+    Get Crossref metadata for many DOIs using the works?filter=doi:... endpoint
+    One request per batch_size DOIs instead of one per DOI
+    Returns {normalized_doi: message}; DOIs that fail are just missing
+    """
+    found = {}
+    dois = [d for d in dict.fromkeys(dois) if d]
+    missing = []
+    for doi in dois:
+        cached = _cache_get('crossref', doi)
+        if cached is not None:
+            found[normalize_doi(doi)] = cached
+        else:
+            missing.append(doi)
+
+    # commas would split the filter, so those rare DOIs go through the single lookup
+    odd = [d for d in missing if ',' in d]
+    dois = [d for d in missing if ',' not in d]
+
+    for i in range(0, len(dois), batch_size):
+        batch = dois[i:i + batch_size]
+        params = {'filter': ','.join(f"doi:{d}" for d in batch), 'rows': len(batch)}
+        try:
+            r = _SESSION.get("https://api.crossref.org/works", params=params, timeout=timeout)
+            r.raise_for_status()
+            items = _loads(r.content).get('message', {}).get('items', [])
+        except Exception:
+            continue
+        for item in items:
+            doi = normalize_doi(item.get('DOI'))
+            if doi:
+                found[doi] = item
+                _cache_put('crossref', doi, item)
+
+    for doi in odd:
+        found[normalize_doi(doi)] = fetch_crossref(doi, timeout=timeout)
+    return found
 
 
 def fetch_unpaywall(doi, email=None, timeout=10):
@@ -77,50 +257,134 @@ def fetch_unpaywall(doi, email=None, timeout=10):
     """
     if not doi:
         return {}
+    cached = _cache_get('unpaywall', doi)
+    if cached is not None:
+        return cached
     
-    doi_clean = doi.replace("https://doi.org/", "").replace("http://doi.org/", "")
-    url = f"https://api.unpaywall.org/v2/{quote(doi_clean, safe='')}"
+    url = f"https://api.unpaywall.org/v2/{_quoted_doi(doi)}"
     params = {'email': email} if email else {}
     
     try:
-        r = requests.get(url, params=params, timeout=timeout)
+        r = _SESSION.get(url, params=params, timeout=timeout)
         r.raise_for_status()
-        return r.json()
+        data = _loads(r.content)
     except Exception:
         return {}
+    _cache_put('unpaywall', doi, data)
+    return data
+
+
+# --- Async API calls (many DOIs at once) ---
+
+async def _fetch_json(session, url, params=None):
+    """
+    GET url and decode JSON, empty dict on any failure
+    Rate limits / 5xx are retried with the same backoff as the sync session
+    """
+    for attempt in range(_RETRY_TOTAL + 1):
+        try:
+            async with session.get(url, params=params) as r:
+                if r.status in _RETRY_STATUSES and attempt < _RETRY_TOTAL:
+                    await asyncio.sleep(_RETRY_BACKOFF * 2 ** attempt)
+                    continue
+                r.raise_for_status()
+                return _loads(await r.read())
+        except Exception:
+            return {}
+    return {}
+
+
+async def fetch_crossref_async(session, doi):
+    """Async version of fetch_crossref"""
+    if not doi:
+        return {}
+    cached = _cache_get('crossref', doi)
+    if cached is not None:
+        return cached
+    data = await _fetch_json(session, f"https://api.crossref.org/works/{_quoted_doi(doi)}")
+    message = data.get('message', {})
+    _cache_put('crossref', doi, message)
+    return message
+
+
+async def fetch_unpaywall_async(session, doi, email=None):
+    """Async version of fetch_unpaywall"""
+    if not doi:
+        return {}
+    cached = _cache_get('unpaywall', doi)
+    if cached is not None:
+        return cached
+    params = {'email': email} if email else None
+    data = await _fetch_json(session, f"https://api.unpaywall.org/v2/{_quoted_doi(doi)}", params)
+    _cache_put('unpaywall', doi, data)
+    return data
+
+
+async def fetch_all(dois, email=None, concurrency=10, crossref=True):
+    """
+    Fetch Crossref + Unpaywall for every DOI with up to `concurrency`
+    requests in flight (Crossref/Unpaywall ask for ~10/s)
+    Returns {doi: (crossref, unpaywall)}; crossref=False skips Crossref
+    """
+    sem = asyncio.Semaphore(concurrency)
+    connector = aiohttp.TCPConnector(limit=concurrency, limit_per_host=concurrency)
+    timeout = aiohttp.ClientTimeout(total=10)
+
+    async with aiohttp.ClientSession(connector=connector, timeout=timeout, headers=_HEADERS) as session:
+        async def limited(coro):
+            async with sem:
+                return await coro
+
+        async def one(doi):
+            unpaywall = limited(fetch_unpaywall_async(session, doi, email))
+            if not crossref:
+                return doi, ({}, await unpaywall)
+            return doi, tuple(await asyncio.gather(limited(fetch_crossref_async(session, doi)), unpaywall))
+
+        pairs = await asyncio.gather(*(one(d) for d in dict.fromkeys(d for d in dois if d)))
+    return dict(pairs)
+
+
+def gather_metadata(dois, email=None, concurrency=10, crossref=True):
+    """Sync entry point for fetch_all"""
+    return asyncio.run(fetch_all(dois, email, concurrency, crossref))
 
 
 # --- Data helpers ---
 
+@lru_cache(maxsize=100_000)
 def normalize_doi(doi):
-    """Lowercase and strip URL prefixes from DOI"""
+    """Lowercase and strip URL prefixes from DOI (memoized, same DOIs recur across stages)"""
     if not doi:
         return None
     doi = doi.lower().strip()
-    return doi.replace("https://doi.org/", "").replace("http://doi.org/", "")
+    return doi.removeprefix("https://doi.org/").removeprefix("http://doi.org/")
 
 
-def _safe_get(data, *keys, default=None):
-    """Dig into nested dicts without KeyErrors"""
-    for key in keys:
-        if isinstance(data, dict):
-            data = data.get(key)
-        else:
-            return default
-    return data if data is not None else default
+def _first(*candidates):
+    """
+    First truthy value from (obj, key_path) pairs, digging into nested dicts
+    without KeyErrors; stops at the first hit
+    """
+    for obj, path in candidates:
+        cur = obj
+        for key in path:
+            if not isinstance(cur, dict):
+                cur = None
+                break
+            cur = cur.get(key)
+        if cur:
+            return cur
+    return None
 
 
 def _extract_authors(work, crossref=None):
     """Pull author names + affiliations from OpenAlex, fallback to Crossref"""
-    authors = []
-    
-    for authorship in (work.get('authorships') or []):
-        author_info = authorship.get('author') or {}
-        name = author_info.get('display_name') or ""
-        institutions = authorship.get('institutions') or []
-        affiliation = institutions[0].get('display_name') if institutions else ""
-        if name:
-            authors.append({"name": name, "affiliation": affiliation or ""})
+    authors = [
+        {"name": name, "affiliation": (a.get('institutions') or [{}])[0].get('display_name') or ""}
+        for a in (work.get('authorships') or [])
+        if (name := (a.get('author') or {}).get('display_name'))
+    ]
     
     if not authors and crossref:
         for a in (crossref.get('author') or []):
@@ -136,15 +400,19 @@ def _extract_authors(work, crossref=None):
 
 
 def _reconstruct_abstract(inverted_index):
-    """OpenAlex stores abstracts as inverted index - reconstruct it."""
+    """
+    OpenAlex stores abstracts as inverted index - reconstruct it.
+    Assumes positions are (nearly) dense 0..L-1, so each word goes straight into
+    its slot instead of sorting. Words sharing a position are all kept, in index order.
+    """
     if not inverted_index:
         return ""
-    words = []
+    max_pos = max((max(p) for p in inverted_index.values() if p), default=-1)
+    words = [''] * (max_pos + 1)
     for word, positions in inverted_index.items():
         for pos in positions:
-            words.append((pos, word))
-    words.sort(key=lambda x: x[0])
-    return ' '.join(w[1] for w in words)
+            words[pos] = f"{words[pos]} {word}" if words[pos] else word
+    return ' '.join(w for w in words if w)  # skip any gaps in the index
 
 
 # --- Document builder ---
@@ -164,29 +432,26 @@ def build_paper_document(work, crossref=None, unpaywall=None):
 
     authors = _extract_authors(work, crossref)
 
-    journal_name = (
-        _safe_get(work, 'host_venue', 'display_name') or
-        _safe_get(work, 'primary_location', 'source', 'display_name') or
-        (crossref.get('container-title') or [None])[0]
-    )
-    issn = (
-        _safe_get(work, 'host_venue', 'issn_l') or
-        _safe_get(work, 'primary_location', 'source', 'issn_l') or
-        (crossref.get('ISSN') or [None])[0]
-    )
+    journal_name = _first(
+        (work, ('host_venue', 'display_name')),
+        (work, ('primary_location', 'source', 'display_name')),
+    ) or (crossref.get('container-title') or [None])[0]
+    issn = _first(
+        (work, ('host_venue', 'issn_l')),
+        (work, ('primary_location', 'source', 'issn_l')),
+    ) or (crossref.get('ISSN') or [None])[0]
 
     is_oa = bool(work.get('is_oa', False)) or bool(unpaywall.get('is_oa', False))
-    pdf_url = (
-        _safe_get(work, 'best_oa_location', 'url_for_pdf') or
-        _safe_get(work, 'primary_location', 'pdf_url') or
-        _safe_get(unpaywall, 'best_oa_location', 'url_for_pdf') or
-        unpaywall.get('url')
-    )
-    oa_status = (
-        _safe_get(work, 'best_oa_location', 'license') or
-        _safe_get(unpaywall, 'best_oa_location', 'license') or
-        ""
+    pdf_url = _first(
+        (work, ('best_oa_location', 'url_for_pdf')),
+        (work, ('primary_location', 'pdf_url')),
+        (unpaywall, ('best_oa_location', 'url_for_pdf')),
+        (unpaywall, ('url',)),
     )
+    oa_status = _first(
+        (work, ('best_oa_location', 'license')),
+        (unpaywall, ('best_oa_location', 'license')),
+    ) or ""
 
     # try multiple sources for abstract
     abstract = (
@@ -206,7 +471,8 @@ def build_paper_document(work, crossref=None, unpaywall=None):
 
     processing_status = determine_processing_status(pdf_url)
 
-    tags = [c.get('display_name') for c in (work.get('concepts') or []) if c.get('display_name')]
+    # tuple is cheaper to build and encodes to the same BSON array
+    tags = tuple(c['display_name'] for c in (work.get('concepts') or []) if c.get('display_name'))
 
     work_id = openalex_id or doi or f"auto:{title[:80]}"
 
@@ -5,10 +5,11 @@ Calculates jargon density by comparing text against a common words list.
 Jargon Score = (Total Words - Common Words) / Total Words
 """
 
-import re
 from collections import Counter
 from pathlib import Path
 
+from lib.text import iter_words
+
 
 # --- Jargon calculation ---
 
@@ -17,21 +18,25 @@ def calculate_jargon_score(text, common_words_set):
     Count how many words aren't in our common words list.
     Only looks at words 3+ chars to skip tiny stuff.
     """
-    text = text.lower()
-    words = re.findall(r'\b[a-z]{3,}\b', text)
+    # single pass over the matches, no intermediate word lists
+    total = 0
+    jargon_counter = Counter()
+    for w in iter_words(text):
+        total += 1
+        # anything not in common_words is "jargon"
+        if w not in common_words_set:
+            jargon_counter[w] += 1
     
-    if not words:
+    if not total:
         return {"score": 0, "total_words": 0, "jargon_count": 0, "top_jargon": []}
     
-    # anything not in common_words is "jargon"
-    jargon_words = [w for w in words if w not in common_words_set]
-    jargon_score = len(jargon_words) / len(words)
+    jargon_count = sum(jargon_counter.values())
     
     return {
-        "score": round(jargon_score, 4),
-        "total_words": len(words),
-        "jargon_count": len(jargon_words),
-        "top_jargon": Counter(jargon_words).most_common(10)
+        "score": round(jargon_count / total, 4),
+        "total_words": total,
+        "jargon_count": jargon_count,
+        "top_jargon": jargon_counter.most_common(10)
     }
 
 
@@ -47,11 +52,11 @@ def load_common_words():
     try:
         with dict_path.open('r', encoding='utf-8') as f:
             content_lines = f.read().splitlines()
-        return set(w.strip().lower() for w in content_lines if w.strip())
+        return frozenset(w.strip().lower() for w in content_lines if w.strip())
     except FileNotFoundError:
         print(f"Warning: dictionary not found at {dict_path}")
         print("Using tiny fallback list")
-        return {'the', 'and', 'for', 'with', 'that', 'this', 'from', 'are', 'was', 'were'}
+        return frozenset({'the', 'and', 'for', 'with', 'that', 'this', 'from', 'are', 'was', 'were'})
 
 
 # --- Main ---
@@ -10,6 +10,28 @@ from pathlib import Path
 sys.path.insert(0, str(Path(__file__).parent.parent))
 from Database.db import get_db
 
+STATUSES = ["pending_download", "downloaded", "pending_parse", "parsed", "failed", "no_pdf_available"]
+
+
+def _count_if(cond):
+    return {"$sum": {"$cond": [cond, 1, 0]}}
+
+
+def paper_stats(papers):
+    """All the papers counts in one aggregation pass instead of a count_documents each."""
+    group = {
+        "_id": None,
+        "total": {"$sum": 1},
+        "with_abstract": _count_if({"$and": [
+            {"$eq": [{"$type": "$content.abstract"}, "string"]},
+            {"$ne": ["$content.abstract", ""]}
+        ]}),
+        "with_jargon": _count_if({"$ne": [{"$type": "$jargon"}, "missing"]}),
+    }
+    for s in STATUSES:
+        group[s] = _count_if({"$eq": ["$processing_status", s]})
+    return next(papers.aggregate([{"$group": group}]), {})
+
 
 def main():
     print("Connecting to database...")
@@ -20,20 +42,19 @@ def main():
         return
     
     papers = db['papers']
-    total = papers.count_documents({})
+    stats = paper_stats(papers)
+    total = stats.get("total", 0)
     
     print("PIPELINE STATUS")
     
     
     print(f"\nPAPERS: {total}")
     if total > 0:
-        with_abstract = papers.count_documents({"content.abstract": {"$ne": None, "$ne": ""}})
-        print(f"   With abstracts: {with_abstract}")
+        print(f"   With abstracts: {stats['with_abstract']}")
         
         # processing status breakdown
-        statuses = ["pending_download", "downloaded", "pending_parse", "parsed", "failed", "no_pdf_available"]
-        for s in statuses:
-            count = papers.count_documents({"processing_status": s})
+        for s in STATUSES:
+            count = stats[s]
             if count > 0:
                 print(f"{s}: {count}")
         
@@ -44,7 +65,8 @@ def main():
             print(f"Abstract: {str(sample.get('content', {}).get('abstract', 'N/A'))[:80]}...")
             print(f"Citations: {sample.get('impact', {}).get('citation_count', 'N/A')}")
     
-    extracted = db['extracted_features'].count_documents({})
+    # metadata counts are plenty for an overview, no need to scan these
+    extracted = db['extracted_features'].estimated_document_count()
     print(f"\nEXTRACTED FEATURES: {extracted}")
     if extracted > 0:
         sample = db['extracted_features'].find_one()
@@ -52,10 +74,10 @@ def main():
             count = sample.get('data_points', {}).get('extraction_count', 0)
             print(f"   Sample extraction count: {count}")
     
-    snapshots = db['snapshots'].count_documents({})
+    snapshots = db['snapshots'].estimated_document_count()
     print(f"\nSNAPSHOTS: {snapshots}")
     
-    with_jargon = papers.count_documents({"jargon": {"$exists": True}})
+    with_jargon = stats.get("with_jargon", 0)
     print(f"\nJARGON SCORED: {with_jargon}")
     
 
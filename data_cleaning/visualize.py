@@ -13,21 +13,7 @@ from Database.db import get_db
 OUTPUT_DIR = Path(__file__).parent / "output"
 
 
-def get_jargon_data(db):
-    papers = list(db['papers'].find({"jargon.score": {"$exists": True}}))
-    return [{
-        "title": p['title'][:50],
-        "jargon": p['jargon']['score'],
-        "citations": p['impact']['citation_count'],
-        "classification": p['impact']['classification'],
-        "year": p.get('year')
-    } for p in papers]
-
-
-def create_jargon_chart(data):
-    OUTPUT_DIR.mkdir(exist_ok=True)
-    
-    html = """<!DOCTYPE html>
+JARGON_TEMPLATE = """<!DOCTYPE html>
 <html>
 <head>
     <title>jargon vs citations</title>
@@ -71,10 +57,41 @@ def create_jargon_chart(data):
     </script>
 </body>
 </html>"""
+
+# split once at import - the data goes between the two halves
+_TEMPLATE_HEAD, _TEMPLATE_TAIL = JARGON_TEMPLATE.split("DATAHERE")
+
+
+def get_jargon_data(db):
+    # only pull the fields the chart uses, and build straight off the cursor
+    papers = db['papers'].find(
+        {"jargon.score": {"$exists": True}},
+        projection={
+            "_id": 0,
+            "title": 1,
+            "jargon.score": 1,
+            "impact.citation_count": 1,
+            "impact.classification": 1,
+            "year": 1
+        }
+    )
+    return [{
+        "title": p['title'][:50],
+        "jargon": p['jargon']['score'],
+        "citations": p['impact']['citation_count'],
+        "classification": p['impact']['classification'],
+        "year": p.get('year')
+    } for p in papers]
+
+
+def create_jargon_chart(data):
+    OUTPUT_DIR.mkdir(exist_ok=True)
     
-    html = html.replace("DATAHERE", json.dumps(data))
     out_path = OUTPUT_DIR / "jargon_analysis.html"
-    out_path.write_text(html)
+    with out_path.open('w', encoding='utf-8') as f:
+        f.write(_TEMPLATE_HEAD)
+        f.write(json.dumps(data))  # dumps, not dump - only one-shot uses the C encoder
+        f.write(_TEMPLATE_TAIL)
     return out_path
 
 
@@ -103,15 +120,25 @@ def print_summary(data):
     if not data:
         return
     
-    avg_jargon = sum(d['jargon'] for d in data) / len(data)
-    print(f"average jargon: {avg_jargon:.1%}")
+    # one pass for the overall, HIGH and LOW averages
+    total = high_sum = low_sum = 0
+    n_high = n_low = 0
+    for d in data:
+        j = d['jargon']
+        total += j
+        if d['classification'] == 'HIGH':
+            high_sum += j
+            n_high += 1
+        elif d['classification'] == 'LOW':
+            low_sum += j
+            n_low += 1
     
-    high = [d for d in data if d['classification'] == 'HIGH']
-    low = [d for d in data if d['classification'] == 'LOW']
+    avg_jargon = total / len(data)
+    print(f"average jargon: {avg_jargon:.1%}")
     
-    if high and low:
-        high_avg = sum(d['jargon'] for d in high) / len(high)
-        low_avg = sum(d['jargon'] for d in low) / len(low)
+    if n_high and n_low:
+        high_avg = high_sum / n_high
+        low_avg = low_sum / n_low
         
         if high_avg < low_avg:
             print("trend: high-cited papers have less jargon")